@@ -1,55 +1,262 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import (Flask, Response, render_template, request, redirect, url_for,
+                   session, flash, stream_with_context, jsonify)
+import bisect
+import importlib.util
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from functools import cache, lru_cache
+from concurrent.futures import Future
+import requests
 import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
-from datetime import datetime
+from flask_caching import Cache
+from flask_compress import Compress
+from transformers import (AutoConfig, AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig, StaticCache,
+                          StoppingCriteria, StoppingCriteriaList)
+from transformers.generation.streamers import BaseStreamer
+from transformers.models.auto.modeling_auto import MODEL_FOR_CAUSAL_LM_MAPPING
 
 # Initialize Flask app
 app = Flask(__name__)
 app.secret_key = 'your-secret-key-change-this-in-production'
 
+# gzip/brotli responses, and short-lived caching of rendered pages
+Compress(app)
+view_cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache'})
+
 # Global variables for AI model
-primary_model_path = "ibm-granite/granite-3.0-3b-a800m-instruct"
+primary_model_path = "ibm-granite/granite-3.0-1b-a400m-instruct"
 fallback_model_path = "microsoft/DialoGPT-small"  # lightweight model for CPU testing
+
+# Optional OpenAI-compatible inference server (vLLM/TGI), e.g. http://localhost:8000.
+# When set, generation is delegated to it and no model is loaded in this process.
+VLLM_URL = os.environ.get('CITIZENAI_VLLM_URL')
+VLLM_MODEL = os.environ.get('CITIZENAI_VLLM_MODEL', primary_model_path)
+VLLM_TIMEOUT_SECONDS = 60
+
+# Weights of the primary model in 16-bit precision (~1.3B params x 2 bytes).
+# NF4 is only used when free VRAM can't hold them plus serving headroom; for
+# a model this small dequantization overhead makes 4-bit decode slower than BF16.
+PRIMARY_MODEL_FP16_BYTES = int(1.3e9 * 2)
+# Extra room for activations and CUDA-graph pools, on top of the KV caches
+VRAM_HEADROOM_FACTOR = 1.2
 tokenizer = None
 model = None
 device = None
 
-# In-memory storage (replace with database in production)
-chat_history = []
-sentiment_data = {'positive': 0, 'neutral': 0, 'negative': 0}
-concerns = []
+# The instructions around the question never change, so they are tokenized
+# once at startup and only the question is tokenized per request
+MAX_INPUT_TOKENS = 512
+_PROMPT_TMPL = """You are a helpful AI assistant for a government citizen engagement platform.
+Provide clear, accurate, and helpful information about government services, policies, and civic processes.
+
+Question: {q}
+
+Answer:"""
+STATIC_PREFIX, STATIC_SUFFIX = _PROMPT_TMPL.split(" {q}")
+prefix_ids = None
+suffix_ids = None
+
+# Questions are clamped before tokenization so oversized input can't blow up
+# prefill cost, and answers stop at the first paragraph break
+MAX_QUESTION_CHARS = 800
+STOP_TEXT = "\n\n"
+stop_sequences = None
+
+# Fixed generation length keeps the static KV cache shape constant so the
+# compiled decode step can be replayed as a CUDA graph
+MAX_NEW_TOKENS = 150
+MAX_CACHE_LEN = MAX_INPUT_TOKENS + MAX_NEW_TOKENS
+
+# Continuous batching: concurrent questions are grouped into one generate() call
+MAX_BATCH_SIZE = 8
+BATCH_WINDOW_SECONDS = 0.02
+SETUP_MESSAGE = "I'm currently setting up my AI capabilities. Please try again in a moment."
+ERROR_MESSAGE = "I’m having technical difficulties right now. Please try again later."
+_STREAM_END = object()
+_request_queue = queue.Queue()
+_batcher_thread = None
+_batcher_lock = threading.Lock()
+_model_init_lock = threading.Lock()
+_model_init_done = False
+_kv_caches = {}  # batch size -> StaticCache, only touched by the batch worker
+_pinned_input_ids = None
+_pinned_attention_mask = None
+
+# Citizens ask the same questions over and over, so answers are kept in an
+# LRU cache keyed by the normalized question
+RESPONSE_CACHE_SIZE = 4096
+_response_cache = OrderedDict()
+_cache_lock = threading.Lock()
+_cache_stats = {'hits': 0, 'misses': 0}
+
+# Persistent storage: SQLite in WAL mode so concurrent requests (and
+# multiple gunicorn workers) can append without clobbering each other
+DATABASE_PATH = os.environ.get('CITIZENAI_DB', 'citizenai.db')
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat_history (
+    id INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,
+    question TEXT NOT NULL,
+    response TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS concerns (
+    id INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sentiment (
+    label TEXT PRIMARY KEY,
+    count INTEGER NOT NULL DEFAULT 0
+);
+INSERT OR IGNORE INTO sentiment (label) VALUES ('positive'), ('neutral'), ('negative');
+"""
+_db_local = threading.local()
+
+# Sentiment keywords, matched at word starts (so 'problems' and 'issues' count)
+# in a single regex pass over the feedback text
+POSITIVE_WORDS = ['good', 'great', 'excellent', 'amazing', 'wonderful', 'fantastic',
+                  'perfect', 'outstanding', 'brilliant', 'superb', 'satisfied',
+                  'happy', 'pleased', 'impressed', 'helpful', 'efficient']
+NEGATIVE_WORDS = ['bad', 'terrible', 'awful', 'horrible', 'disappointing',
+                  'frustrated', 'angry', 'upset', 'poor', 'inadequate', 'useless',
+                  'slow', 'delayed', 'problem', 'issue', 'complaint']
+SENTIMENT_RE = re.compile(r"\b(?:(?P<positive>" + "|".join(POSITIVE_WORDS) + r")|(?P<negative>"
+                          + "|".join(NEGATIVE_WORDS) + r"))\w*")
+
+# Feedback is scored in batches by a background thread: one regex pass over
+# all texts queued within the window, and one database write per batch
+SENTIMENT_BATCH_SIZE = 64
+SENTIMENT_BATCH_WINDOW_SECONDS = 0.02
+_feedback_queue = queue.Queue()
+_sentiment_thread = None
+_sentiment_lock = threading.Lock()
+
+def load_tokenizer(model_path):
+    """Load the tokenizer and pre-tokenize the static parts of the prompt"""
+    global tokenizer, prefix_ids, suffix_ids, stop_sequences
+
+    tokenizer = AutoTokenizer.from_pretrained(model_path, use_fast=True)
+    if not tokenizer.is_fast:
+        raise RuntimeError(f"No fast (Rust) tokenizer available for {model_path}; "
+                           "install the 'tokenizers' package")
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+
+    prefix_ids = tokenizer(STATIC_PREFIX, return_tensors="pt").input_ids[0]
+    suffix_ids = tokenizer(STATIC_SUFFIX, add_special_tokens=False,
+                           return_tensors="pt").input_ids[0]
+    # A paragraph break may come out as one merged token or as two newlines
+    newline_ids = tokenizer.encode("\n", add_special_tokens=False)
+    stop_sequences = [tokenizer.encode(STOP_TEXT, add_special_tokens=False), newline_ids * 2]
+
+def kv_cache_budget_bytes(config):
+    """16-bit KV memory for one StaticCache per batch size, 1..MAX_BATCH_SIZE"""
+    head_dim = getattr(config, "head_dim", None) or config.hidden_size // config.num_attention_heads
+    kv_heads = getattr(config, "num_key_value_heads", None) or config.num_attention_heads
+    bytes_per_token = 2 * config.num_hidden_layers * kv_heads * head_dim * 2
+    cached_rows = MAX_BATCH_SIZE * (MAX_BATCH_SIZE + 1) // 2
+    return cached_rows * MAX_CACHE_LEN * bytes_per_token
+
+def half_precision_dtype():
+    """BF16 where the GPU supports it natively (Ampere+), FP16 otherwise"""
+    if torch.cuda.is_available() and torch.cuda.is_bf16_supported(including_emulation=False):
+        return torch.bfloat16
+    return torch.float16
+
+# Low-VRAM fallback: 4-bit NF4 weights with double quantization. Built on
+# first use, not at import, because it needs bitsandbytes and a CUDA context.
+# The embeddings and the vocabulary projection stay in 16-bit, since lm_head is
+# read in full on every decode step and dequantizing it costs more than it saves.
+@cache
+def _bnb_config():
+    return BitsAndBytesConfig(
+        load_in_4bit=True,
+        bnb_4bit_compute_dtype=half_precision_dtype(),
+        bnb_4bit_use_double_quant=True,
+        bnb_4bit_quant_type="nf4",
+        llm_int8_skip_modules=["lm_head", "embed_tokens"]
+    )
+
+def select_attn_implementation(config):
+    """SDPA, or FlashAttention-2 when the static-cache path isn't available anyway"""
+    # Prompts here are short, so FA2 gains little over SDPA, and FA2 rules out
+    # the StaticCache and CUDA-graph decode path
+    model_class = MODEL_FOR_CAUSAL_LM_MAPPING.get(type(config), None)
+    if model_class is not None and model_class._supports_static_cache:
+        return "sdpa"
+    if (torch.cuda.is_available() and torch.cuda.get_device_capability()[0] >= 8
+            and importlib.util.find_spec("flash_attn") is not None):
+        return "flash_attention_2"
+    return "sdpa"
 
 def initialize_model():
     """Initialize the IBM Granite model, with fallback to a smaller model"""
-    global tokenizer, model, device
+    global model, device
+
+    if VLLM_URL:
+        print(f"Using inference server at {VLLM_URL} ({VLLM_MODEL}); no local model loaded")
+        return True
 
     print("Initializing AI model...")
     device = "cuda" if torch.cuda.is_available() else "cpu"
     print(f"Using device: {device}")
 
+    # Inference only: no autograd bookkeeping, and let cuBLAS/cuDNN pick fast kernels
+    torch.set_grad_enabled(False)
+    if device == "cuda":
+        torch.backends.cuda.matmul.allow_tf32 = True
+        torch.backends.cudnn.benchmark = True
+
     try:
         # Try Granite first
-        tokenizer = AutoTokenizer.from_pretrained(primary_model_path)
+        load_tokenizer(primary_model_path)
+        config = AutoConfig.from_pretrained(primary_model_path)
+        attn_implementation = select_attn_implementation(config)
+        print(f"Attention implementation: {attn_implementation}")
         if device == "cuda":
-            quantization_config = BitsAndBytesConfig(
-                load_in_4bit=True,
-                bnb_4bit_compute_dtype=torch.float16,
-                bnb_4bit_use_double_quant=True,
-                bnb_4bit_quant_type="nf4"
-            )
-            model = AutoModelForCausalLM.from_pretrained(
-                primary_model_path,
-                quantization_config=quantization_config,
-                device_map="auto",
-                torch_dtype=torch.float16
-            )
+            free_vram, _ = torch.cuda.mem_get_info()
+            required_vram = (PRIMARY_MODEL_FP16_BYTES * VRAM_HEADROOM_FACTOR
+                             + kv_cache_budget_bytes(config))
+            dtype = half_precision_dtype()
+            if free_vram >= required_vram:
+                print(f"Loading in {dtype} ({free_vram / 1e9:.1f} GB free VRAM)")
+                model = AutoModelForCausalLM.from_pretrained(
+                    primary_model_path,
+                    device_map="auto",
+                    torch_dtype=dtype,
+                    attn_implementation=attn_implementation
+                )
+            else:
+                print(f"Loading in 4-bit NF4 with {dtype} compute ({free_vram / 1e9:.1f} GB free VRAM, "
+                      f"{required_vram / 1e9:.1f} GB needed for 16-bit)")
+                model = AutoModelForCausalLM.from_pretrained(
+                    primary_model_path,
+                    quantization_config=_bnb_config(),
+                    device_map="auto",
+                    torch_dtype=dtype,
+                    attn_implementation=attn_implementation
+                )
+                lm_head = model.get_output_embeddings()
+                print(f"lm_head: {type(lm_head).__name__} ({lm_head.weight.dtype})")
         else:
             model = AutoModelForCausalLM.from_pretrained(
                 primary_model_path,
-                torch_dtype=torch.float32
+                torch_dtype=torch.float32,
+                attn_implementation=attn_implementation
             )
             model.to(device)
+        model.eval()
         print("✅ Granite model initialized successfully!")
+        # CUDA graphs need the fixed shapes of the static KV cache
+        if device == "cuda" and not getattr(model, "is_loaded_in_4bit", False) and uses_static_cache():
+            compile_model()
         return True
 
     except Exception as e:
@@ -58,9 +265,10 @@ def initialize_model():
 
         # Fallback model
         try:
-            tokenizer = AutoTokenizer.from_pretrained(fallback_model_path)
+            load_tokenizer(fallback_model_path)
             model = AutoModelForCausalLM.from_pretrained(fallback_model_path)
             model.to(device)
+            model.eval()
             print("✅ Fallback model initialized successfully!")
             return True
         except Exception as e2:
@@ -68,67 +276,447 @@ def initialize_model():
             print("Running with dummy responses only.")
             return False
 
-def generate_response(question):
-    """Generate response using available AI model"""
-    global tokenizer, model, device
-
-    if model is None or tokenizer is None:
-        return "I'm currently setting up my AI capabilities. Please try again in a moment."
+def compile_model():
+    """Compile the decode step and capture it into CUDA graphs"""
+    print("Compiling decode step with torch.compile (reduce-overhead)...")
+    eager_forward = model.forward
+    compiled_forward = torch.compile(eager_forward, mode="reduce-overhead", fullgraph=False)
+
+    # Prefill width varies with the longest prompt in a batch, so it stays
+    # eager; decode steps are one token wide against the fixed-size StaticCache,
+    # which leaves batch size as the only shape that varies
+    def forward(*args, **kwargs):
+        input_ids = kwargs.get("input_ids", args[0] if args else None)
+        if input_ids is not None and input_ids.shape[1] == 1:
+            return compiled_forward(*args, **kwargs)
+        return eager_forward(*args, **kwargs)
+
+    model.forward = forward
+
+    # Trigger compilation now rather than on the first citizen's request. This
+    # goes through the batch worker because CUDA-graph state is per thread, and
+    # covers every batch size, i.e. every decode shape.
+    start = time.perf_counter()
+    for batch_size in range(1, MAX_BATCH_SIZE + 1):
+        pending = [_submit("How do I renew my passport?") for _ in range(batch_size)]
+        for item in pending:
+            item.future.result()
+    print(f"✅ Warmup generation finished in {time.perf_counter() - start:.1f}s")
+
+class StopOnTokens(StoppingCriteria):
+    """Stop each row once its generated text ends with one of the stop sequences"""
+
+    def __init__(self, sequences, prompt_length):
+        self.sequences = [torch.tensor(seq, dtype=torch.long) for seq in sequences if seq]
+        self.prompt_length = prompt_length
+
+    def __call__(self, input_ids, scores, **kwargs):
+        done = torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+        generated = input_ids.shape[1] - self.prompt_length
+        for i, seq in enumerate(self.sequences):
+            # Require some text before the break so a leading newline isn't an empty answer
+            if generated <= len(seq):
+                continue
+            if seq.device != input_ids.device:
+                seq = self.sequences[i] = seq.to(input_ids.device)
+            done |= (input_ids[:, -len(seq):] == seq).all(dim=1)
+        return done
+
+class _PendingRequest:
+    """A question waiting in the queue for the batch worker"""
+
+    def __init__(self, input_ids):
+        self.input_ids = input_ids
+        self.future = Future()
+        self.tokens = queue.Queue()
+
+
+class _BatchStreamer(BaseStreamer):
+    """Fans out tokens from one batched generate() call to each request's queue"""
+
+    def __init__(self, pending):
+        self.pending = pending
+        self.token_ids = [[] for _ in pending]
+        self.sent_text = [""] * len(pending)
+        self.prompt_seen = False
+
+    def put(self, value):
+        # generate() passes the prompt ids first; only new tokens are streamed
+        if not self.prompt_seen:
+            self.prompt_seen = True
+            return
+
+        for i, token_id in enumerate(value.reshape(len(self.pending), -1)[:, -1].tolist()):
+            self.token_ids[i].append(token_id)
+            text = tokenizer.decode(self.token_ids[i], skip_special_tokens=True)
+            # Hold back incomplete multi-byte characters until the next token
+            if text.endswith("\ufffd") or len(text) <= len(self.sent_text[i]):
+                continue
+            self.pending[i].tokens.put(text[len(self.sent_text[i]):])
+            self.sent_text[i] = text
+
+    def end(self):
+        for request_item in self.pending:
+            request_item.tokens.put(_STREAM_END)
+
+
+def build_prompt(question):
+    """Full prompt text, for backends that tokenize on their side"""
+    return _PROMPT_TMPL.format(q=question)
+
+def encode_question(question):
+    """Build prompt token ids, tokenizing only the question itself"""
+    max_question_tokens = MAX_INPUT_TOKENS - len(prefix_ids) - len(suffix_ids)
+    question_ids = tokenizer(" " + question, add_special_tokens=False, truncation=True,
+                             max_length=max_question_tokens, return_attention_mask=False,
+                             return_token_type_ids=False, return_tensors="pt").input_ids[0]
+    return torch.cat([prefix_ids, question_ids, suffix_ids])
+
+def uses_static_cache():
+    # FlashAttention-2 manages its own unpadded KV layout and rejects StaticCache
+    return (getattr(model, "_supports_static_cache", False)
+            and model.config._attn_implementation != "flash_attention_2")
+
+def _get_kv_cache(batch_size):
+    """Reuse one preallocated static KV cache per batch size"""
+    if not uses_static_cache():
+        return None
+
+    kv_cache = _kv_caches.get(batch_size)
+    if kv_cache is None:
+        kv_cache = StaticCache(config=model.config, batch_size=batch_size,
+                               max_cache_len=MAX_CACHE_LEN, device=model.device, dtype=model.dtype)
+        _kv_caches[batch_size] = kv_cache
+    else:
+        kv_cache.reset()
+    return kv_cache
+
+def _host_batch_buffers(batch_size, width):
+    """Host tensors for a batch; on CUDA these are views of reusable pinned memory"""
+    global _pinned_input_ids, _pinned_attention_mask
+
+    if device != "cuda":
+        return (torch.empty((batch_size, width), dtype=torch.long),
+                torch.empty((batch_size, width), dtype=torch.long))
+
+    # Flat buffers so each (batch_size, width) view stays contiguous for DMA
+    if _pinned_input_ids is None:
+        _pinned_input_ids = torch.empty(MAX_BATCH_SIZE * MAX_INPUT_TOKENS,
+                                        dtype=torch.long).pin_memory()
+        _pinned_attention_mask = torch.empty(MAX_BATCH_SIZE * MAX_INPUT_TOKENS,
+                                             dtype=torch.long).pin_memory()
+    size = batch_size * width
+    return (_pinned_input_ids[:size].view(batch_size, width),
+            _pinned_attention_mask[:size].view(batch_size, width))
+
+def _generate_batch(pending):
+    """Run a single generate() call for a batch of queued requests"""
+    # Left-pad so every prompt ends right where generation starts
+    width = max(len(item.input_ids) for item in pending)
+    input_ids, attention_mask = _host_batch_buffers(len(pending), width)
+    input_ids.fill_(tokenizer.pad_token_id)
+    attention_mask.zero_()
+    for row, item in enumerate(pending):
+        input_ids[row, width - len(item.input_ids):] = item.input_ids
+        attention_mask[row, width - len(item.input_ids):] = 1
+    input_ids = input_ids.to(device, non_blocking=True)
+    attention_mask = attention_mask.to(device, non_blocking=True)
+
+    with torch.inference_mode():
+        outputs = model.generate(
+            input_ids,
+            attention_mask=attention_mask,
+            past_key_values=_get_kv_cache(len(pending)),
+            max_new_tokens=MAX_NEW_TOKENS,
+            stopping_criteria=StoppingCriteriaList([StopOnTokens(stop_sequences, width)]),
+            do_sample=False,
+            num_beams=1,
+            pad_token_id=tokenizer.pad_token_id,
+            repetition_penalty=1.1,
+            streamer=_BatchStreamer(pending)
+        )
+
+    # Decode only the generated tokens, never the prompt
+    new_tokens = outputs[:, input_ids.shape[1]:]
+    return [response.strip()
+            for response in tokenizer.batch_decode(new_tokens, skip_special_tokens=True)]
+
+def _collect_batch(work_queue, max_size, window_seconds):
+    """Block for one item, then gather any others arriving within the batch window"""
+    pending = [work_queue.get()]
+    deadline = time.monotonic() + window_seconds
+    while len(pending) < max_size:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            pending.append(work_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return pending
+
+def _batch_worker():
+    """Background loop that owns the model and serves queued requests in batches"""
+    while True:
+        pending = _collect_batch(_request_queue, MAX_BATCH_SIZE, BATCH_WINDOW_SECONDS)
+        try:
+            responses = _generate_batch(pending)
+        except Exception as e:
+            print(f"Error generating response: {e}")
+            responses = [ERROR_MESSAGE] * len(pending)
+            # Streams see the failure through the future's result
+            for item in pending:
+                item.tokens.put(_STREAM_END)
+
+        for item, response in zip(pending, responses):
+            item.future.set_result(response)
+
+def _submit(question):
+    """Queue a question for the batch worker, starting the worker on first use"""
+    global _batcher_thread
+
+    with _batcher_lock:
+        if _batcher_thread is None:
+            _batcher_thread = threading.Thread(target=_batch_worker, name="generate-batcher",
+                                               daemon=True)
+            _batcher_thread.start()
+
+    pending = _PendingRequest(encode_question(question))
+    _request_queue.put(pending)
+    return pending
+
+def normalize_question(question):
+    return " ".join(question.lower().split())
+
+def get_cached_response(question):
+    key = normalize_question(question)
+    with _cache_lock:
+        response = _response_cache.get(key)
+        if response is None:
+            _cache_stats['misses'] += 1
+            return None
+        _cache_stats['hits'] += 1
+        _response_cache.move_to_end(key)
+        return response
 
+def cache_response(question, response):
+    if response in (SETUP_MESSAGE, ERROR_MESSAGE):
+        return
+    key = normalize_question(question)
+    with _cache_lock:
+        _response_cache[key] = response
+        _response_cache.move_to_end(key)
+        if len(_response_cache) > RESPONSE_CACHE_SIZE:
+            _response_cache.popitem(last=False)
+
+def clear_response_cache():
+    """Empty the response cache and return the hit/miss counts it had"""
+    with _cache_lock:
+        stats = dict(_cache_stats, size=len(_response_cache))
+        _response_cache.clear()
+        _cache_stats['hits'] = _cache_stats['misses'] = 0
+    return stats
+
+class GenerationError(Exception):
+    """A streamed answer failed after part of it had already been sent"""
+
+def _vllm_request(question, stream):
+    response = requests.post(f"{VLLM_URL}/v1/completions", json={
+        "model": VLLM_MODEL,
+        "prompt": build_prompt(question),
+        "max_tokens": MAX_NEW_TOKENS,
+        "temperature": 0,
+        "repetition_penalty": 1.1,
+        "stop": [STOP_TEXT],
+        "stream": stream
+    }, stream=stream, timeout=VLLM_TIMEOUT_SECONDS)
+    response.raise_for_status()
+    return response
+
+def _vllm_generate(question):
+    """Generate a complete answer on the inference server"""
     try:
-        prompt = f"""You are a helpful AI assistant for a government citizen engagement platform. 
-        Provide clear, accurate, and helpful information about government services, policies, and civic processes.
-
-        Question: {question}
-
-        Answer:"""
-
-        inputs = tokenizer(prompt, return_tensors="pt", truncation=True, max_length=512)
-        inputs = inputs.to(device)
-
-        with torch.no_grad():
-            outputs = model.generate(
-                inputs.input_ids,
-                max_new_tokens=150,
-                temperature=0.7,
-                do_sample=True,
-                pad_token_id=tokenizer.eos_token_id,
-                repetition_penalty=1.1
-            )
-
-        response = tokenizer.decode(outputs[0], skip_special_tokens=True)
-        if "Answer:" in response:
-            response = response.split("Answer:")[-1].strip()
+        return _vllm_request(question, stream=False).json()["choices"][0]["text"].strip()
+    except (requests.RequestException, KeyError, IndexError, ValueError) as e:
+        print(f"Error generating response: {e}")
+        return ERROR_MESSAGE
+
+def _vllm_stream(question):
+    """Yield answer text chunks from the inference server's SSE stream"""
+    with _vllm_request(question, stream=True) as response:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line or not line.startswith("data: "):
+                continue
+            data = line[len("data: "):]
+            if data == "[DONE]":
+                break
+            # Usage-only chunks carry an empty choices list
+            choices = json.loads(data).get("choices")
+            if not choices:
+                continue
+            text = choices[0]["text"]
+            if text:
+                yield text
 
-        return response
+def generate_response(question):
+    """Generate response using available AI model"""
+    if not VLLM_URL and (model is None or tokenizer is None):
+        return SETUP_MESSAGE
 
-    except Exception as e:
-        print(f"Error generating response: {e}")
-        return "I’m having technical difficulties right now. Please try again later."
-
-def analyze_sentiment(text):
-    """Simple sentiment analysis function"""
-    text_lower = text.lower()
-
-    positive_words = ['good', 'great', 'excellent', 'amazing', 'wonderful', 'fantastic',
-                      'perfect', 'outstanding', 'brilliant', 'superb', 'satisfied',
-                      'happy', 'pleased', 'impressed', 'helpful', 'efficient']
-    negative_words = ['bad', 'terrible', 'awful', 'horrible', 'disappointing',
-                      'frustrated', 'angry', 'upset', 'poor', 'inadequate', 'useless',
-                      'slow', 'delayed', 'problem', 'issue', 'complaint']
-
-    positive_score = sum(1 for word in positive_words if word in text_lower)
-    negative_score = sum(1 for word in negative_words if word in text_lower)
-
-    if positive_score > negative_score:
-        return 'Positive'
-    elif negative_score > positive_score:
-        return 'Negative'
-    else:
-        return 'Neutral'
+    response = get_cached_response(question)
+    if response is None:
+        if VLLM_URL:
+            response = _vllm_generate(question)
+        else:
+            response = _submit(question).future.result()
+        cache_response(question, response)
+    return response
+
+def stream_response(question):
+    """Yield response text chunks as the batch worker produces them"""
+    if not VLLM_URL and (model is None or tokenizer is None):
+        yield SETUP_MESSAGE
+        return
+
+    response = get_cached_response(question)
+    if response is not None:
+        yield response
+        return
+
+    if VLLM_URL:
+        chunks = []
+        try:
+            for chunk in _vllm_stream(question):
+                chunks.append(chunk)
+                yield chunk
+        except (requests.RequestException, KeyError, IndexError, ValueError) as e:
+            print(f"Error generating response: {e}")
+            if chunks:
+                raise GenerationError(str(e)) from e
+            yield ERROR_MESSAGE
+            return
+        cache_response(question, "".join(chunks).strip())
+        return
+
+    pending = _submit(question)
+    sent = False
+    while True:
+        chunk = pending.tokens.get()
+        if chunk is _STREAM_END:
+            break
+        sent = True
+        yield chunk
+
+    response = pending.future.result()
+    if response == ERROR_MESSAGE:
+        if sent:
+            raise GenerationError("generation failed after streaming started")
+        yield ERROR_MESSAGE
+        return
+    cache_response(question, response)
+
+def analyze_sentiments(texts):
+    """Label many feedback texts with a single regex pass over their concatenation"""
+    lowered = [text.lower() for text in texts]
+    starts = []
+    offset = 0
+    for text in lowered:
+        starts.append(offset)
+        offset += len(text) + 1
+    joined = "\n".join(lowered)
+
+    scores = [{'positive': 0, 'negative': 0} for _ in texts]
+    for match in SENTIMENT_RE.finditer(joined):
+        scores[bisect.bisect_right(starts, match.start()) - 1][match.lastgroup] += 1
+
+    labels = []
+    for score in scores:
+        if score['positive'] > score['negative']:
+            labels.append('Positive')
+        elif score['negative'] > score['positive']:
+            labels.append('Negative')
+        else:
+            labels.append('Neutral')
+    return labels
+
+def _sentiment_worker():
+    """Background loop that scores and records queued feedback in batches"""
+    while True:
+        pending = _collect_batch(_feedback_queue, SENTIMENT_BATCH_SIZE,
+                                 SENTIMENT_BATCH_WINDOW_SECONDS)
+        try:
+            labels = analyze_sentiments([text for text, _ in pending])
+            record_sentiments([label.lower() for label in labels])
+        except Exception as e:
+            print(f"Error analyzing feedback: {e}")
+            for _, future in pending:
+                future.set_exception(e)
+            continue
+
+        for (_, future), label in zip(pending, labels):
+            future.set_result(label)
+
+def classify_feedback(text):
+    """Queue feedback for the sentiment worker and wait for its label"""
+    global _sentiment_thread
+
+    with _sentiment_lock:
+        if _sentiment_thread is None:
+            _sentiment_thread = threading.Thread(target=_sentiment_worker, name="sentiment-batcher",
+                                                 daemon=True)
+            _sentiment_thread.start()
+
+    future = Future()
+    _feedback_queue.put((text, future))
+    return future.result()
+
+# ------------------- STORAGE -------------------
+
+def get_db():
+    """Return this thread's SQLite connection, creating the schema on first use"""
+    conn = getattr(_db_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DATABASE_PATH, timeout=10, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        _db_local.conn = conn
+    return conn
+
+def save_chat_entry(entry):
+    get_db().execute("INSERT INTO chat_history (ts, question, response) VALUES (?, ?, ?)",
+                     (entry['ts'], entry['question'], entry['response']))
+
+def save_concern(entry):
+    get_db().execute("INSERT INTO concerns (ts, text, status) VALUES (?, ?, ?)",
+                     (entry['ts'], entry['text'], entry['status']))
+
+def record_sentiments(sentiment_keys):
+    get_db().executemany("UPDATE sentiment SET count = count + ? WHERE label = ?",
+                         [(count, key) for key, count in Counter(sentiment_keys).items()])
+
+def get_recent_concerns(limit=10):
+    """Most recent concerns, oldest first"""
+    rows = get_db().execute("SELECT ts, text, status FROM concerns "
+                            "ORDER BY id DESC LIMIT ?", (limit,)).fetchall()
+    return [dict(row) for row in reversed(rows)]
+
+def get_sentiment_data():
+    rows = get_db().execute("SELECT label, count FROM sentiment").fetchall()
+    return {row['label']: row['count'] for row in rows}
+
+def count_interactions():
+    return get_db().execute("SELECT COUNT(*) FROM chat_history").fetchone()[0]
 
 # ------------------- ROUTES -------------------
 
+# Timestamps are stored as epoch seconds and only formatted when displayed
+@app.template_filter('datetime')
+@lru_cache(maxsize=1024)
+def format_timestamp(ts):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts))
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -145,6 +733,11 @@ def services():
 def chat():
     if 'logged_in' not in session:
         return redirect(url_for('login'))
+    return _render_chat_shell()
+
+# Cached below the login check so the cache can never bypass it
+@view_cache.cached(timeout=300, key_prefix='chat_shell')
+def _render_chat_shell():
     return render_template('chat.html')
 
 @app.route('/ask', methods=['POST'])
@@ -152,21 +745,56 @@ def ask_question():
     if 'logged_in' not in session:
         return redirect(url_for('login'))
 
-    question = request.form.get('question', '').strip()
+    question = request.form.get('question', '').strip()[:MAX_QUESTION_CHARS]
     if not question:
         return render_template('chat.html', error="Please enter a question.")
 
     response = generate_response(question)
 
     chat_entry = {
-        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'ts': int(time.time()),
         'question': question,
         'response': response
     }
-    chat_history.append(chat_entry)
+    save_chat_entry(chat_entry)
 
+    # Partial page updates only need the answer fragment
+    if request.headers.get('HX-Request'):
+        return render_template('partials/answer.html', question_response=response,
+                               user_question=question)
     return render_template('chat.html', question_response=response, user_question=question)
 
+@app.route('/ask/stream', methods=['POST'])
+def ask_question_stream():
+    if 'logged_in' not in session:
+        return redirect(url_for('login'))
+
+    question = request.form.get('question', '').strip()[:MAX_QUESTION_CHARS]
+    if not question:
+        return Response("event: error\ndata: \"Please enter a question.\"\n\n",
+                        mimetype='text/event-stream')
+
+    def events():
+        chunks = []
+        try:
+            for chunk in stream_response(question):
+                chunks.append(chunk)
+                yield f"data: {json.dumps(chunk)}\n\n"
+        except GenerationError:
+            # Don't keep a truncated answer; the client replaces it with the error
+            yield f"event: error\ndata: {json.dumps(ERROR_MESSAGE)}\n\n"
+            return
+
+        save_chat_entry({
+            'ts': int(time.time()),
+            'question': question,
+            'response': "".join(chunks).strip()
+        })
+        yield "event: done\ndata: {}\n\n"
+
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/feedback', methods=['POST'])
 def submit_feedback():
     if 'logged_in' not in session:
@@ -176,10 +804,7 @@ def submit_feedback():
     if not feedback_text:
         return render_template('chat.html', error="Please enter feedback text.")
 
-    sentiment = analyze_sentiment(feedback_text)
-    sentiment_key = sentiment.lower()
-    if sentiment_key in sentiment_data:
-        sentiment_data[sentiment_key] += 1
+    sentiment = classify_feedback(feedback_text)
 
     return render_template('chat.html', sentiment=sentiment, feedback_text=feedback_text)
 
@@ -193,11 +818,11 @@ def submit_concern():
         return render_template('chat.html', error="Please enter your concern.")
 
     concern_entry = {
-        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'ts': int(time.time()),
         'text': concern_text,
         'status': 'Open'
     }
-    concerns.append(concern_entry)
+    save_concern(concern_entry)
 
     return render_template('chat.html', concern_submitted=True)
 
@@ -205,12 +830,26 @@ def submit_concern():
 def dashboard():
     if 'logged_in' not in session:
         return redirect(url_for('login'))
+    return _render_dashboard()
 
-    recent_concerns = concerns[-10:] if concerns else []
+# Dashboard figures don't need sub-second freshness
+@view_cache.cached(timeout=5, key_prefix='dashboard')
+def _render_dashboard():
     return render_template('dashboard.html',
-                           sentiment_data=sentiment_data,
-                           recent_concerns=recent_concerns,
-                           total_interactions=len(chat_history))
+                           sentiment_data=get_sentiment_data(),
+                           recent_concerns=get_recent_concerns(10),
+                           total_interactions=count_interactions())
+
+@app.route('/cache/clear', methods=['POST'])
+def clear_cache():
+    if session.get('username') != 'admin':
+        return redirect(url_for('login'))
+
+    stats = clear_response_cache()
+    view_cache.clear()
+    total = stats['hits'] + stats['misses']
+    stats['hit_rate'] = stats['hits'] / total if total else 0.0
+    return jsonify(stats)
 
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -236,16 +875,27 @@ def logout():
 
 # ------------------- MAIN -------------------
 
+def ensure_model_initialized():
+    """Load the model exactly once per process, however many threads ask"""
+    global _model_init_done
+
+    with _model_init_lock:
+        if _model_init_done:
+            return
+        _model_init_done = True
+
+        try:
+            model_initialized = initialize_model()
+            if not model_initialized:
+                print("⚠ Running with fallback or dummy responses only.")
+        except Exception as e:
+            print(f"Error during model initialization: {e}")
+            print("Continuing with dummy responses...")
+
 if __name__ == '__main__':
+    # Development server only; production runs one process under gunicorn (see wsgi.py)
     print("Starting CitizenAI Application...")
-
-    try:
-        model_initialized = initialize_model()
-        if not model_initialized:
-            print("⚠ Running with fallback or dummy responses only.")
-    except Exception as e:
-        print(f"Error during model initialization: {e}")
-        print("Continuing with dummy responses...")
+    ensure_model_initialized()
 
     print("Flask application starting...")
-    app.run(debug=True, host='0.0.0.0', port=5000)
+    app.run(debug=False, host='0.0.0.0', port=5000, threaded=True)
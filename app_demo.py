@@ -5,6 +5,7 @@ This version runs without heavy AI models for quick testing and demonstration.
 
 from flask import Flask, render_template, request, redirect, url_for, session, flash
 from datetime import datetime
+import re
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -15,6 +16,13 @@ chat_history = []
 sentiment_data = {'positive': 0, 'neutral': 0, 'negative': 0}
 concerns = []
 
+# Sentiment keywords, matched at word starts (so 'problems' and 'issues' count)
+# in a single regex pass over the feedback text
+POSITIVE_WORDS = ['good', 'great', 'excellent', 'amazing', 'wonderful', 'fantastic', 'perfect', 'outstanding', 'brilliant', 'superb', 'satisfied', 'happy', 'pleased', 'impressed', 'helpful', 'efficient', 'fast', 'friendly', 'professional']
+NEGATIVE_WORDS = ['bad', 'terrible', 'awful', 'horrible', 'disappointing', 'frustrated', 'angry', 'upset', 'poor', 'inadequate', 'useless', 'slow', 'delayed', 'problem', 'issue', 'complaint', 'rude', 'unprofessional', 'broken']
+POSITIVE_RE = re.compile(r"\b(?:" + "|".join(POSITIVE_WORDS) + r")\w*")
+NEGATIVE_RE = re.compile(r"\b(?:" + "|".join(NEGATIVE_WORDS) + r")\w*")
+
 def demo_generate_response(question):
     """Demo response generator with predefined responses"""
     question_lower = question.lower()
@@ -54,11 +62,8 @@ def analyze_sentiment(text):
     """Simple sentiment analysis function"""
     text_lower = text.lower()
     
-    positive_words = ['good', 'great', 'excellent', 'amazing', 'wonderful', 'fantastic', 'perfect', 'outstanding', 'brilliant', 'superb', 'satisfied', 'happy', 'pleased', 'impressed', 'helpful', 'efficient', 'fast', 'friendly', 'professional']
-    negative_words = ['bad', 'terrible', 'awful', 'horrible', 'disappointing', 'frustrated', 'angry', 'upset', 'poor', 'inadequate', 'useless', 'slow', 'delayed', 'problem', 'issue', 'complaint', 'rude', 'unprofessional', 'broken']
-    
-    positive_score = sum(1 for word in positive_words if word in text_lower)
-    negative_score = sum(1 for word in negative_words if word in text_lower)
+    positive_score = len(POSITIVE_RE.findall(text_lower))
+    negative_score = len(NEGATIVE_RE.findall(text_lower))
     
     if positive_score > negative_score:
         return 'Positive'
@@ -0,0 +1,111 @@
+import time
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+import torch
+
+import app
+
+
+@pytest.fixture(autouse=True)
+def empty_response_cache():
+    app.clear_response_cache()
+    yield
+    app.clear_response_cache()
+
+
+@pytest.fixture
+def client():
+    app.app.config['TESTING'] = True
+    with app.app.test_client() as client:
+        yield client
+
+
+def test_normalize_question_ignores_case_and_whitespace():
+    assert app.normalize_question("  How DO   I\nrenew my Passport? ") == "how do i renew my passport?"
+
+
+def test_cached_response_is_shared_by_equivalent_questions():
+    app.cache_response("How do I renew my passport?", "Visit the passport office.")
+
+    assert app.get_cached_response("  how do i RENEW my passport? ") == "Visit the passport office."
+    assert app.get_cached_response("How do I vote?") is None
+    assert app.clear_response_cache() == {'hits': 1, 'misses': 1, 'size': 1}
+
+
+def test_least_recently_used_entry_is_evicted(monkeypatch):
+    monkeypatch.setattr(app, 'RESPONSE_CACHE_SIZE', 2)
+    app.cache_response("first", "1")
+    app.cache_response("second", "2")
+    app.get_cached_response("first")
+    app.cache_response("third", "3")
+
+    assert app.get_cached_response("second") is None
+    assert app.get_cached_response("first") == "1"
+    assert app.get_cached_response("third") == "3"
+
+
+@pytest.mark.parametrize("message", [app.SETUP_MESSAGE, app.ERROR_MESSAGE])
+def test_setup_and_error_messages_are_not_cached(message):
+    app.cache_response("How do I vote?", message)
+
+    assert app.get_cached_response("How do I vote?") is None
+
+
+def test_cache_clear_requires_admin(client):
+    app.cache_response("How do I vote?", "At your polling place.")
+
+    response = client.post('/cache/clear')
+
+    assert response.status_code == 302
+    assert '/login' in response.headers['Location']
+    assert app.get_cached_response("How do I vote?") == "At your polling place."
+
+
+def test_cache_clear_reports_hit_rate_and_empties_cache(client):
+    app.cache_response("How do I vote?", "At your polling place.")
+    app.get_cached_response("How do I vote?")
+    app.get_cached_response("How do I vote?")
+    app.get_cached_response("Where do I pay taxes?")
+    with client.session_transaction() as session:
+        session['logged_in'] = True
+        session['username'] = 'admin'
+
+    response = client.post('/cache/clear')
+
+    assert response.get_json() == {'hits': 2, 'misses': 1, 'size': 1, 'hit_rate': pytest.approx(2 / 3)}
+    assert app.get_cached_response("How do I vote?") is None
+
+
+def test_stop_on_tokens_stops_rows_ending_in_a_stop_sequence():
+    criteria = app.StopOnTokens([[5, 6], [7], []], prompt_length=2)
+    input_ids = torch.tensor([
+        [1, 2, 3, 5, 6],
+        [1, 2, 3, 4, 7],
+        [1, 2, 3, 6, 5],
+    ])
+
+    assert criteria(input_ids, None).tolist() == [True, True, False]
+
+
+def test_stop_on_tokens_ignores_a_break_at_the_start_of_the_answer():
+    criteria = app.StopOnTokens([[5, 6], [7]], prompt_length=2)
+
+    # Only the stop sequence itself has been generated so far
+    assert criteria(torch.tensor([[1, 2, 5, 6]]), None).tolist() == [False]
+    assert criteria(torch.tensor([[1, 2, 7]]), None).tolist() == [False]
+
+
+def test_format_timestamp_uses_local_time():
+    ts = 1700000000
+
+    assert app.format_timestamp(ts) == time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ts))
+
+
+def test_granite_uses_sdpa_for_the_static_cache_path():
+    from transformers import GraniteMoeConfig
+
+    assert app.select_attn_implementation(GraniteMoeConfig()) == "sdpa"
@@ -0,0 +1,25 @@
+import pytest
+
+import app_demo
+
+CASES = [
+    ("The site has many problems and issues", "Negative"),
+    ("Not good. Problems problems problems.", "Negative"),
+    ("Great, helpful staff", "Positive"),
+    ("I bought a box of tissues", "Neutral"),
+    ("", "Neutral"),
+]
+
+
+@pytest.mark.parametrize("text, expected", CASES)
+def test_demo_analyze_sentiment(text, expected):
+    assert app_demo.analyze_sentiment(text) == expected
+
+
+def test_analyze_sentiments_batch():
+    pytest.importorskip("torch")
+    pytest.importorskip("transformers")
+    import app
+
+    texts = [text for text, _ in CASES]
+    assert app.analyze_sentiments(texts) == [expected for _, expected in CASES]
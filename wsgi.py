@@ -0,0 +1,15 @@
+"""
+CitizenAI WSGI entry point for production.
+
+Run a single worker process so every request shares one GPU-resident model,
+with threads feeding the batch worker concurrently:
+
+    gunicorn -k gthread -w 1 --threads 16 --timeout 600 -b 0.0.0.0:5000 wsgi:app
+
+The model is loaded (and compiled) while the worker imports this module,
+before it starts heartbeating, so the timeout must cover the whole load.
+"""
+
+from app import app, ensure_model_initialized
+
+ensure_model_initialized()